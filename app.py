@@ -1,12 +1,21 @@
 import os
 import re
+import sys
+import atexit
 import json
+import time
 import sqlite3
-import urllib.request
+import tempfile
+import threading
+import http.client
 import urllib.parse
+from contextlib import nullcontext
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 from urllib.parse import urlparse, parse_qs
 
+import jinja2
 from flask import (
     Flask, g, redirect, render_template, request, url_for,
     flash, abort, session, jsonify
@@ -18,9 +27,24 @@ DATABASE_URL = os.environ.get("DATABASE_URL")  # Render Postgres
 IS_PG = bool(DATABASE_URL)
 
 if IS_PG:
-    import psycopg
     from psycopg.rows import dict_row
-    from psycopg.errors import UniqueViolation
+    from psycopg.errors import UniqueViolation, ForeignKeyViolation
+    from psycopg_pool import ConnectionPool
+
+    def _configure_pg(conn):
+        # Prepare statements server-side after the first execution so hot
+        # queries skip re-parse/re-plan on every request.
+        conn.prepare_threshold = 1
+
+    # Pre-established connections; a fresh PG connect (TCP + TLS + auth)
+    # costs tens of milliseconds per request otherwise.
+    POOL = ConnectionPool(
+        DATABASE_URL,
+        min_size=int(os.environ.get("MYTUBE_PG_POOL_MIN", "2")),
+        max_size=int(os.environ.get("MYTUBE_PG_POOL_MAX", "10")),
+        kwargs={"row_factory": dict_row},
+        configure=_configure_pg,
+    )
 
 APP_TITLE = "MyTube"
 DB_PATH = os.environ.get("MYTUBE_DB", "mytube.db")  # SQLite fallback lokalt
@@ -32,32 +56,279 @@ ADMIN_PASSWORD = os.environ.get("MYTUBE_ADMIN_PASS", "admin")
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-change-me")
 
+# Persist compiled templates on disk so freshly forked Gunicorn workers
+# skip the Jinja parser, and stop stat()-ing template files per render.
+_JINJA_CACHE_DIR = os.path.join(tempfile.gettempdir(), "mytube_jinja_cache")
+os.makedirs(_JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache(directory=_JINJA_CACHE_DIR)
+app.jinja_env.auto_reload = False
+
+# Compile the hot templates at import time instead of on first request.
+for _tpl in ("base.html", "index.html", "watch.html", "history.html", "admin.html"):
+    try:
+        app.jinja_env.get_template(_tpl)
+    except Exception:
+        pass
+
+# Cheaper jsonify(): skip key sorting and emit compact separators.
+app.json.sort_keys = False
+app.json.compact = True
+
 
 # ---------- Small SQL helpers ----------
 def q(sqlite_sql: str, pg_sql: str) -> str:
-    """Pick SQL depending on engine."""
+    """Pick SQL depending on engine.
+
+    Only used at import time to build the SQL_* module constants below;
+    handlers execute the constants so no dialect branch runs per request.
+    """
     return pg_sql if IS_PG else sqlite_sql
 
 
 def dt(col: str) -> str:
-    """Datetime cast for ordering (created_at stored as ISO string)."""
-    # SQLite: datetime(created_at)
-    # Postgres: created_at::timestamp (works for ISO8601 strings)
-    return f"{col}::timestamp" if IS_PG else f"datetime({col})"
+    """Ordering expression for created_at-style columns.
+
+    All timestamps are written as datetime.utcnow().isoformat() — UTC
+    ISO-8601 strings — which sort chronologically as plain text. The old
+    datetime()/::timestamp cast re-computed the conversion per row and
+    kept the created_at indexes from being used for ORDER BY.
+    """
+    return col
+
 
+# SQLite LIKE is case-insensitive by default for ASCII; Postgres LIKE is
+# case-sensitive, so use ILIKE there. The engine is fixed at startup, so
+# this is a constant rather than a per-call branch.
+LIKE_OP = "ILIKE" if IS_PG else "LIKE"
 
-def like_op() -> str:
-    # SQLite LIKE is case-insensitive by default for ASCII; Postgres LIKE is case-sensitive.
-    # To behave more similar: use ILIKE on Postgres.
-    return "ILIKE" if IS_PG else "LIKE"
 
+# Raised when an INSERT references a missing row. On SQLite any
+# IntegrityError on a conflict-free insert means the FK failed.
+FK_ERR = (ForeignKeyViolation,) if IS_PG else (sqlite3.IntegrityError,)
+
+# Raised when an INSERT hits a unique constraint (duplicate username).
+UNIQUE_ERR = (UniqueViolation,) if IS_PG else (sqlite3.IntegrityError,)
+
+
+# ---------- SQL (chosen once per engine) ----------
+# Statement text is fixed at import time: the sqlite-vs-pg branch in q()
+# runs once here instead of on every execute, and Postgres always sees
+# byte-identical strings for its prepared-statement cache.
+
+SQL_USER_BY_ID = q(
+    "SELECT id, username, is_admin FROM users WHERE id=?",
+    "SELECT id, username, is_admin FROM users WHERE id=%s",
+)
+SQL_USER_FOR_LOGIN = q(
+    "SELECT id, username, password_hash, is_admin FROM users WHERE username=?",
+    "SELECT id, username, password_hash, is_admin FROM users WHERE username=%s",
+)
+SQL_USER_REGISTER = q(
+    "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (?, ?, 0, ?)",
+    "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (%s, %s, 0, %s)",
+)
+SQL_USER_EDIT_BY_ID = q(
+    "SELECT id, username, is_admin, created_at FROM users WHERE id=?",
+    "SELECT id, username, is_admin, created_at FROM users WHERE id=%s",
+)
+SQL_USER_SET_USERNAME = q(
+    "UPDATE users SET username=? WHERE id=?",
+    "UPDATE users SET username=%s WHERE id=%s",
+)
+SQL_USER_SET_ADMIN = q(
+    "UPDATE users SET is_admin=? WHERE id=?",
+    "UPDATE users SET is_admin=%s WHERE id=%s",
+)
+SQL_USER_SET_PASSWORD = q(
+    "UPDATE users SET password_hash=? WHERE id=?",
+    "UPDATE users SET password_hash=%s WHERE id=%s",
+)
 
-def is_unique_violation(exc: Exception) -> bool:
-    if IS_PG and isinstance(exc, UniqueViolation):
-        return True
-    if isinstance(exc, sqlite3.IntegrityError):
-        return True
-    return False
+SQL_VIDEO_BY_ID = q(
+    "SELECT * FROM videos WHERE id=?",
+    "SELECT * FROM videos WHERE id=%s",
+)
+SQL_VIDEO_BY_ID_WITH_LIKED = q(
+    """
+    SELECT v.*, EXISTS(
+        SELECT 1 FROM video_likes WHERE user_id=? AND video_id=v.id
+    ) AS liked_flag
+    FROM videos v WHERE v.id=?
+    """,
+    """
+    SELECT v.*, EXISTS(
+        SELECT 1 FROM video_likes WHERE user_id=%s AND video_id=v.id
+    ) AS liked_flag
+    FROM videos v WHERE v.id=%s
+    """,
+)
+SQL_VIDEO_INSERT = q(
+    """
+    INSERT INTO videos
+      (title, description, source_url, embed_url, thumbnail_url, provider, created_at, embed_html, category)
+    VALUES
+      (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    """
+    INSERT INTO videos
+      (title, description, source_url, embed_url, thumbnail_url, provider, created_at, embed_html, category)
+    VALUES
+      (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """,
+)
+SQL_VIDEO_UPDATE = q(
+    """
+    UPDATE videos
+    SET title=?, description=?, source_url=?, embed_url=?, thumbnail_url=?,
+        provider=?, embed_html=?, category=?
+    WHERE id=?
+    """,
+    """
+    UPDATE videos
+    SET title=%s, description=%s, source_url=%s, embed_url=%s, thumbnail_url=%s,
+        provider=%s, embed_html=%s, category=%s
+    WHERE id=%s
+    """,
+)
+SQL_VIDEO_DELETE = q(
+    "DELETE FROM videos WHERE id=? RETURNING id",
+    "DELETE FROM videos WHERE id=%s RETURNING id",
+)
+SQL_VIDEO_FLUSH_VIEWS = q(
+    "UPDATE videos SET views = views + ? WHERE id=?",
+    "UPDATE videos SET views = views + %s WHERE id=%s",
+)
+SQL_RECOMMENDED = q(
+    f"""
+    SELECT * FROM videos
+    WHERE id != ?
+    ORDER BY (provider = ?) DESC, {dt('created_at')} DESC
+    LIMIT 12
+    """,
+    f"""
+    SELECT * FROM videos
+    WHERE id != %s
+    ORDER BY (provider = %s) DESC, {dt('created_at')} DESC
+    LIMIT 12
+    """,
+)
+SQL_ADMIN_VIDEOS = f"SELECT * FROM videos ORDER BY {dt('created_at')} DESC"
+SQL_ADMIN_USERS = f"SELECT id, username, is_admin, created_at FROM users ORDER BY {dt('created_at')} DESC"
+
+# The watch page shows the newest comments only; without a LIMIT every
+# comment on a popular video was materialized into Python objects.
+COMMENTS_PER_PAGE = 50
+SQL_COMMENTS_FOR_VIDEO = q(
+    f"SELECT * FROM comments WHERE video_id=? ORDER BY {dt('created_at')} DESC LIMIT ?",
+    f"SELECT * FROM comments WHERE video_id=%s ORDER BY {dt('created_at')} DESC LIMIT %s",
+)
+SQL_COMMENT_INSERT = q(
+    """
+    INSERT INTO comments (video_id, user_id, author, body, created_at)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+    """
+    INSERT INTO comments (video_id, user_id, author, body, created_at)
+    VALUES (%s, %s, %s, %s, %s)
+    """,
+)
+
+SQL_HISTORY_FLUSH = q(
+    """
+    INSERT INTO watch_history (user_id, video_id, last_watched_at, watch_count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, video_id)
+    DO UPDATE SET last_watched_at = excluded.last_watched_at,
+                 watch_count = watch_count + excluded.watch_count
+    """,
+    """
+    INSERT INTO watch_history (user_id, video_id, last_watched_at, watch_count)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT(user_id, video_id)
+    DO UPDATE SET last_watched_at = EXCLUDED.last_watched_at,
+                 watch_count = watch_history.watch_count + EXCLUDED.watch_count
+    """,
+)
+SQL_HISTORY_PAGE = q(
+    f"""
+    SELECT h.last_watched_at, h.watch_count, v.*
+    FROM watch_history h
+    JOIN videos v ON v.id = h.video_id
+    WHERE h.user_id = ?
+    ORDER BY {dt('h.last_watched_at')} DESC
+    """,
+    f"""
+    SELECT h.last_watched_at, h.watch_count, v.*
+    FROM watch_history h
+    JOIN videos v ON v.id = h.video_id
+    WHERE h.user_id = %s
+    ORDER BY {dt('h.last_watched_at')} DESC
+    """,
+)
+
+SQL_PLAYLIST_FOR_VIDEO = q(
+    """
+    SELECT p.id as playlist_id, p.name as playlist_name
+    FROM playlist_items pi
+    JOIN playlists p ON p.id = pi.playlist_id
+    WHERE pi.video_id = ?
+    LIMIT 1
+    """,
+    """
+    SELECT p.id as playlist_id, p.name as playlist_name
+    FROM playlist_items pi
+    JOIN playlists p ON p.id = pi.playlist_id
+    WHERE pi.video_id = %s
+    LIMIT 1
+    """,
+)
+# Everything the watch-page sidebar needs in one pass: the playlist the
+# video belongs to, its items in display order, and (via LEAD over that
+# same order) each item's successor, from which the autoplay target for
+# the current video falls out in Python.
+SQL_PLAYLIST_SIDEBAR = q(
+    f"""
+    SELECT v.*, pi.position, pi.playlist_id, p.name AS playlist_name,
+           LEAD(v.id) OVER (ORDER BY pi.position ASC, {dt('v.created_at')} DESC) AS next_id
+    FROM playlist_items pi
+    JOIN videos v ON v.id = pi.video_id
+    JOIN playlists p ON p.id = pi.playlist_id
+    WHERE pi.playlist_id = (SELECT playlist_id FROM playlist_items WHERE video_id = ? LIMIT 1)
+    ORDER BY pi.position ASC, {dt('v.created_at')} DESC
+    """,
+    f"""
+    SELECT v.*, pi.position, pi.playlist_id, p.name AS playlist_name,
+           LEAD(v.id) OVER (ORDER BY pi.position ASC, {dt('v.created_at')} DESC) AS next_id
+    FROM playlist_items pi
+    JOIN videos v ON v.id = pi.video_id
+    JOIN playlists p ON p.id = pi.playlist_id
+    WHERE pi.playlist_id = (SELECT playlist_id FROM playlist_items WHERE video_id = %s LIMIT 1)
+    ORDER BY pi.position ASC, {dt('v.created_at')} DESC
+    """,
+)
+SQL_PLAYLISTS_LIST = f"SELECT id, name FROM playlists ORDER BY {dt('created_at')} DESC"
+SQL_PLAYLIST_INSERT = q(
+    "INSERT INTO playlists (name, created_at) VALUES (?, ?) RETURNING id",
+    "INSERT INTO playlists (name, created_at) VALUES (%s, %s) RETURNING id",
+)
+SQL_PLAYLIST_ITEM_DELETE = q(
+    "DELETE FROM playlist_items WHERE playlist_id=? AND video_id=?",
+    "DELETE FROM playlist_items WHERE playlist_id=%s AND video_id=%s",
+)
+SQL_PLAYLIST_ITEM_UPSERT = q(
+    """
+    INSERT INTO playlist_items (playlist_id, video_id, position)
+    VALUES (?, ?, ?)
+    ON CONFLICT(playlist_id, video_id)
+    DO UPDATE SET position=excluded.position
+    """,
+    """
+    INSERT INTO playlist_items (playlist_id, video_id, position)
+    VALUES (%s, %s, %s)
+    ON CONFLICT(playlist_id, video_id)
+    DO UPDATE SET position=EXCLUDED.position
+    """,
+)
 
 
 # ---------- i18n ----------
@@ -313,42 +584,113 @@ I18N = {
     },
 }
 
+# Frozen and key-interned: interned keys let dict lookups hit CPython's
+# identity fast path (Jinja interns template string literals), and the
+# read-only views keep the per-request dicts bound on g from being
+# mutated by accident.
+I18N = {
+    lang: MappingProxyType({sys.intern(k): v for k, v in d.items()})
+    for lang, d in I18N.items()
+}
+
 
 def get_lang() -> str:
+    # Cached per request; t() calls this for every translated string.
+    if "lang" in g:
+        return g.lang
     lang = (session.get("lang") or "sv").lower()
-    return lang if lang in SUPPORTED_LANGS else "sv"
+    if lang not in SUPPORTED_LANGS:
+        lang = "sv"
+    g.lang = lang
+    return lang
+
+
+@app.before_request
+def _bind_i18n():
+    # Warm the per-request language cache; t() reads g.lang directly.
+    get_lang()
+
+
+@app.before_request
+def _bind_wants_json():
+    # Content negotiation parsed once per request instead of per handler.
+    accept = request.headers.get("Accept") or ""
+    g.wants_json = (
+        request.headers.get("X-Requested-With") == "XMLHttpRequest"
+        or "application/json" in accept
+        or request.args.get("ajax") == "1"
+    )
+
+
+@app.before_request
+def _bind_now():
+    # One timestamp per request: cheaper than repeated utcnow() calls and
+    # keeps every row written by a single handler consistent.
+    g.now_iso = datetime.utcnow().isoformat()
+
+
+@lru_cache(maxsize=None)
+def _resolve_text(lang: str, key: str) -> str:
+    # Bounded: lang is one of SUPPORTED_LANGS and keys are the literal
+    # translation keys used in code and templates. Parameterized strings
+    # cache the format template, not the rendered result.
+    return I18N[lang].get(key) or I18N["sv"].get(key) or key
 
 
 def t(key: str, **kwargs) -> str:
-    lang = get_lang()
-    text = I18N.get(lang, {}).get(key) or I18N["sv"].get(key) or key
-    if kwargs:
-        try:
-            return text.format(**kwargs)
-        except Exception:
-            return text
-    return text
+    text = _resolve_text(g.lang, key)
+    if not kwargs:
+        return text
+    try:
+        return text.format(**kwargs)
+    except Exception:
+        return text
 
 
 # ---------- DB ----------
+_SQLITE_LOCAL = threading.local()
+
+
+def _sqlite_conn():
+    # One connection per thread, kept open across requests: opening the
+    # file, re-running the PRAGMAs and re-warming the statement cache per
+    # request threw away most of what the settings below buy.
+    conn = getattr(_SQLITE_LOCAL, "conn", None)
+    if conn is None:
+        # cached_statements keeps all the app's (stable, module-constant)
+        # SQL compiled across executes.
+        conn = sqlite3.connect(DB_PATH, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        # WAL lets readers run alongside a writer (journal_mode is
+        # sticky per file); the rest trade a little durability and
+        # memory for far fewer fsyncs and read syscalls.
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA mmap_size=268435456;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA cache_size=-131072;")
+        _SQLITE_LOCAL.conn = conn
+    return conn
+
+
 def get_db():
     if "db" not in g:
-        if IS_PG:
-            # Postgres
-            g.db = psycopg.connect(DATABASE_URL, row_factory=dict_row)
-        else:
-            # SQLite
-            g.db = sqlite3.connect(DB_PATH)
-            g.db.row_factory = sqlite3.Row
-            g.db.execute("PRAGMA foreign_keys = ON;")
+        # Postgres (pooled) or the thread's long-lived SQLite connection.
+        g.db = POOL.getconn() if IS_PG else _sqlite_conn()
     return g.db
 
 
 @app.teardown_appcontext
-def close_db(_exc):
+def close_db(exc):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        if IS_PG:
+            POOL.putconn(db)
+        elif exc is not None:
+            # The connection outlives the request; make sure a failed
+            # handler does not leave a transaction (and its lock) open.
+            db.rollback()
 
 
 def _ensure_column_sqlite(db, table: str, col: str, ddl: str):
@@ -359,7 +701,33 @@ def _ensure_column_sqlite(db, table: str, col: str, ddl: str):
         db.commit()
 
 
+# Werkzeug's default pbkdf2 runs 600k iterations of pure-C-but-GIL-held
+# hashing, pinning the worker for the whole KDF. scrypt goes through
+# OpenSSL, which releases the GIL, so other requests keep running while
+# a hash is computed. Old pbkdf2 hashes still verify (the method is
+# encoded in the stored hash).
+_PW_HASH_METHOD = "scrypt"
+
+
+def hash_password(password: str) -> str:
+    return generate_password_hash(password, method=_PW_HASH_METHOD)
+
+
+@lru_cache(maxsize=1)
+def _admin_password_hash() -> str:
+    # The KDF is deliberately slow (~100 ms+). Lazy so workers only pay
+    # it when seeding an empty database, and cached so it is computed at
+    # most once per process.
+    return hash_password(ADMIN_PASSWORD)
+
+
+_DB_READY = False
+
+
 def init_db():
+    global _DB_READY
+    if _DB_READY:
+        return
     db = get_db()
 
     if IS_PG:
@@ -443,16 +811,33 @@ def init_db():
 
         db.execute("CREATE INDEX IF NOT EXISTS idx_videos_created ON videos(created_at);")
         db.execute("CREATE INDEX IF NOT EXISTS idx_comments_video ON comments(video_id);")
+        # Serves WHERE video_id=? ORDER BY created_at DESC as a pure
+        # index range scan instead of filter + sort.
+        db.execute("CREATE INDEX IF NOT EXISTS idx_comments_video_created ON comments(video_id, created_at DESC);")
         db.execute("CREATE INDEX IF NOT EXISTS idx_history_user_time ON watch_history(user_id, last_watched_at);")
         db.execute("CREATE INDEX IF NOT EXISTS idx_playlist_pos ON playlist_items(playlist_id, position);")
+        # Covering indexes for the views/likes homepage sorts; without
+        # them those orderings re-sort the whole table per request.
+        db.execute("CREATE INDEX IF NOT EXISTS idx_videos_views_created ON videos(views DESC, created_at DESC);")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_videos_likes_created ON videos(likes DESC, created_at DESC);")
+        # Expression index so the homepage category list does not scan
+        # and re-TRIM/LOWER every row.
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_videos_cat_lower "
+            "ON videos (LOWER(TRIM(category))) WHERE TRIM(category) != '';"
+        )
 
         db.commit()
 
+        # The cheap pre-check keeps the (slow) password hash off every
+        # boot; ON CONFLICT covers the race when several workers start
+        # against an empty database at once.
         admin = db.execute("SELECT id FROM users WHERE username=%s", (ADMIN_USERNAME,)).fetchone()
         if not admin:
             db.execute(
-                "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (%s, %s, %s, %s)",
-                (ADMIN_USERNAME, generate_password_hash(ADMIN_PASSWORD), 1, datetime.utcnow().isoformat()),
+                "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (username) DO NOTHING",
+                (ADMIN_USERNAME, _admin_password_hash(), 1, datetime.utcnow().isoformat()),
             )
             db.commit()
 
@@ -531,6 +916,7 @@ def init_db():
 
             CREATE INDEX IF NOT EXISTS idx_videos_created ON videos(created_at);
             CREATE INDEX IF NOT EXISTS idx_comments_video ON comments(video_id);
+            CREATE INDEX IF NOT EXISTS idx_comments_video_created ON comments(video_id, created_at DESC);
             CREATE INDEX IF NOT EXISTS idx_history_user_time ON watch_history(user_id, last_watched_at);
             CREATE INDEX IF NOT EXISTS idx_playlist_pos ON playlist_items(playlist_id, position);
             """
@@ -540,33 +926,146 @@ def init_db():
         _ensure_column_sqlite(db, "videos", "embed_html", "ALTER TABLE videos ADD COLUMN embed_html TEXT DEFAULT '';")
         _ensure_column_sqlite(db, "videos", "category", "ALTER TABLE videos ADD COLUMN category TEXT DEFAULT '';")
 
+        # After the migration above so the column is guaranteed to exist.
+        db.execute("CREATE INDEX IF NOT EXISTS idx_videos_category ON videos(category);")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_videos_views_created ON videos(views DESC, created_at DESC);")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_videos_likes_created ON videos(likes DESC, created_at DESC);")
+        db.commit()
+
+        # See the PG branch: pre-check avoids hashing on every boot,
+        # INSERT OR IGNORE makes first boot race-free across workers.
         admin = db.execute("SELECT id FROM users WHERE username=?", (ADMIN_USERNAME,)).fetchone()
         if not admin:
             db.execute(
-                "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (?, ?, ?, ?)",
-                (ADMIN_USERNAME, generate_password_hash(ADMIN_PASSWORD), 1, datetime.utcnow().isoformat()),
+                "INSERT OR IGNORE INTO users (username, password_hash, is_admin, created_at) VALUES (?, ?, ?, ?)",
+                (ADMIN_USERNAME, _admin_password_hash(), 1, datetime.utcnow().isoformat()),
             )
             db.commit()
 
+    _DB_READY = True
+
+
+# ---------- Deferred write batching ----------
+# View counts are absorbed into an in-process counter and flushed to the
+# database in batches by a daemon thread, so /watch no longer pays a
+# committed UPDATE per hit. Not-yet-flushed counts are added back when
+# rendering; at most one flush interval of counts is lost on a crash.
+_FLUSH_INTERVAL = 30  # seconds
+_PENDING_LOCK = threading.Lock()
+_PENDING_VIEWS = {}  # video_id -> count
+_PENDING_HISTORY = {}  # (user_id, video_id) -> [last_watched_at, count]
+_flusher_started = False
+
+
+def _bump_views(video_id: int):
+    with _PENDING_LOCK:
+        _PENDING_VIEWS[video_id] = _PENDING_VIEWS.get(video_id, 0) + 1
+    _ensure_flusher()
+
+
+def _bump_history(user_id: int, video_id: int, now_iso: str):
+    with _PENDING_LOCK:
+        entry = _PENDING_HISTORY.get((user_id, video_id))
+        if entry is None:
+            _PENDING_HISTORY[(user_id, video_id)] = [now_iso, 1]
+        else:
+            entry[0] = max(entry[0], now_iso)
+            entry[1] += 1
+    _ensure_flusher()
+
+
+def _pending_views(video_id: int) -> int:
+    with _PENDING_LOCK:
+        return _PENDING_VIEWS.get(video_id, 0)
+
+
+def _open_flush_db():
+    """Connection for the flusher, which runs outside any request."""
+    if IS_PG:
+        return POOL.getconn(), POOL.putconn
+    # The flusher is its own thread, so this reuses its thread-local
+    # connection across flushes.
+    return _sqlite_conn(), lambda c: None
+
+
+def _flush_pending():
+    with _PENDING_LOCK:
+        views = dict(_PENDING_VIEWS)
+        _PENDING_VIEWS.clear()
+        history = dict(_PENDING_HISTORY)
+        _PENDING_HISTORY.clear()
+    if not views and not history:
+        return
+    conn, release = _open_flush_db()
+    try:
+        if views:
+            try:
+                conn.cursor().executemany(
+                    SQL_VIDEO_FLUSH_VIEWS,
+                    [(n, vid) for vid, n in views.items()],
+                )
+                conn.commit()
+            except Exception:
+                # Re-queue so a transient DB error does not lose the counts.
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                with _PENDING_LOCK:
+                    for vid, n in views.items():
+                        _PENDING_VIEWS[vid] = _PENDING_VIEWS.get(vid, 0) + n
+        if history:
+            try:
+                conn.cursor().executemany(
+                    SQL_HISTORY_FLUSH,
+                    [(uid, vid, ts, n) for (uid, vid), (ts, n) in history.items()],
+                )
+                conn.commit()
+            except Exception:
+                # History is best-effort; dropping the batch beats
+                # re-queueing rows whose video may have been deleted
+                # (the FK would then poison every later flush).
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+    finally:
+        release(conn)
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(_FLUSH_INTERVAL)
+        _flush_pending()
 
-@app.before_request
-def _ensure_db():
-    init_db()
+
+def _ensure_flusher():
+    global _flusher_started
+    if _flusher_started:
+        return
+    with _PENDING_LOCK:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    threading.Thread(target=_flusher_loop, name="mytube-flush", daemon=True).start()
+
+
+atexit.register(_flush_pending)
 
 
 # ---------- Auth helpers ----------
 def current_user():
+    # Cached per request (g is request-scoped) so repeated calls from
+    # handlers and inject_globals cost one SELECT at most.
+    if "user" in g:
+        return g.user
     uid = session.get("user_id")
     if not uid:
+        g.user = None
         return None
     db = get_db()
-    return db.execute(
-        q(
-            "SELECT id, username, is_admin FROM users WHERE id=?",
-            "SELECT id, username, is_admin FROM users WHERE id=%s",
-        ),
-        (uid,),
-    ).fetchone()
+    g.user = db.execute(SQL_USER_BY_ID, (uid,)).fetchone()
+    return g.user
 
 
 def require_login():
@@ -580,9 +1079,41 @@ def require_admin():
         abort(403)
 
 
+class _LazyUser:
+    """Defers the current_user() lookup until a template touches `me`.
+
+    Supports the truth/attribute/subscript access Jinja performs, so
+    renders that never dereference `me` skip the users SELECT entirely.
+    """
+
+    __slots__ = ("_loaded", "_row")
+
+    def __init__(self):
+        self._loaded = False
+        self._row = None
+
+    def _load(self):
+        if not self._loaded:
+            self._row = current_user()
+            self._loaded = True
+        return self._row
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __getitem__(self, key):
+        row = self._load()
+        if row is None:
+            raise KeyError(key)
+        return row[key]
+
+
 @app.context_processor
 def inject_globals():
-    return {"app_title": APP_TITLE, "me": current_user(), "t": t, "lang": get_lang()}
+    return {"app_title": APP_TITLE, "me": _LazyUser(), "t": t, "lang": get_lang()}
 
 
 @app.route("/lang/<lang_code>")
@@ -596,29 +1127,163 @@ def set_lang(lang_code: str):
 
 
 # ---------- oEmbed helpers ----------
-def reddit_oembed_html(post_url: str):
+# The oEmbed endpoints block the worker for up to 10 s per call and the
+# returned HTML rarely changes, so results (including failures) are kept
+# in a per-process cache for a day.
+_OEMBED_TTL = 86400  # seconds
+_OEMBED_CACHE = {}  # post_url -> (expires_at, html or None)
+_OEMBED_MISS = object()
+
+
+def _oembed_cache_get(post_url: str):
+    hit = _OEMBED_CACHE.get(post_url)
+    if hit is not None and hit[0] > time.time():
+        return hit[1]
+    return _OEMBED_MISS
+
+
+def _oembed_cache_put(post_url: str, html):
+    _OEMBED_CACHE[post_url] = (time.time() + _OEMBED_TTL, html)
+    return html
+
+
+# Keep-alive connections per oEmbed host, so consecutive fetches reuse
+# one TCP + TLS session instead of handshaking every time. The lock only
+# guards the dict: connections are checked out before the request and
+# checked back in after, so fetches never serialize on the network I/O
+# and two threads never share a socket.
+_OEMBED_CONNS = {}  # hostname -> http.client.HTTPSConnection
+_OEMBED_CONNS_LOCK = threading.Lock()
+
+
+def _oembed_conn_get(host: str):
+    with _OEMBED_CONNS_LOCK:
+        conn = _OEMBED_CONNS.pop(host, None)
+    return conn or http.client.HTTPSConnection(host, timeout=10)
+
+
+def _oembed_conn_put(host: str, conn):
+    with _OEMBED_CONNS_LOCK:
+        if host not in _OEMBED_CONNS:
+            _OEMBED_CONNS[host] = conn
+            return
+    # Another fetch already parked a connection for this host.
     try:
-        api = "https://www.reddit.com/oembed?url=" + urllib.parse.quote(post_url, safe="")
-        req = urllib.request.Request(api, headers={"User-Agent": "MyTube/1.0 (oembed)"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        return data.get("html")
+        conn.close()
     except Exception:
-        return None
+        pass
 
 
-def tiktok_oembed_html(post_url: str):
+def _oembed_fetch(api: str, _redirects: int = 3):
+    """Fetch an oEmbed document and return its html field (or None)."""
+    parsed = urlparse(api)
+    host = parsed.hostname
+    path = parsed.path + ("?" + parsed.query if parsed.query else "")
+    # Two attempts: a kept-alive connection may have gone stale.
+    for attempt in (1, 2):
+        conn = _oembed_conn_get(host)
+        try:
+            conn.request("GET", path, headers={"User-Agent": "MyTube/1.0 (oembed)"})
+            resp = conn.getresponse()
+            body = resp.read()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            if attempt == 2:
+                return None
+            continue
+        _oembed_conn_put(host, conn)
+        break
+    if 300 <= resp.status < 400 and _redirects > 0:
+        location = resp.getheader("Location")
+        if location:
+            return _oembed_fetch(urllib.parse.urljoin(api, location), _redirects - 1)
+        return None
+    if resp.status != 200:
+        return None
     try:
-        api = "https://www.tiktok.com/oembed?url=" + urllib.parse.quote(post_url, safe="")
-        req = urllib.request.Request(api, headers={"User-Agent": "MyTube/1.0 (oembed)"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-        return data.get("html")
+        # json.loads accepts bytes directly; skipping the explicit decode
+        # avoids an extra copy of the response body.
+        return json.loads(body).get("html")
     except Exception:
         return None
 
 
+def reddit_oembed_html(post_url: str):
+    cached = _oembed_cache_get(post_url)
+    if cached is not _OEMBED_MISS:
+        return cached
+    api = "https://www.reddit.com/oembed?url=" + urllib.parse.quote(post_url, safe="")
+    return _oembed_cache_put(post_url, _oembed_fetch(api))
+
+
+def tiktok_oembed_html(post_url: str):
+    cached = _oembed_cache_get(post_url)
+    if cached is not _OEMBED_MISS:
+        return cached
+    api = "https://www.tiktok.com/oembed?url=" + urllib.parse.quote(post_url, safe="")
+    return _oembed_cache_put(post_url, _oembed_fetch(api))
+
+
 # ---------- URL -> embed conversion ----------
+_YOUTUBE_SHORTS_RE = re.compile(r"/shorts/([^/?]+)")
+_VIMEO_ID_RE = re.compile(r"/(\d+)")
+_LOOM_SHARE_RE = re.compile(r"/share/([^/?]+)")
+
+
+# Per-provider handlers; returning None falls back to ("custom", url).
+def _embed_reddit(url, parsed):
+    return ("reddit", url)
+
+
+def _embed_tiktok(url, parsed):
+    return ("tiktok", url)
+
+
+def _embed_youtube(url, parsed):
+    qs = parse_qs(parsed.query)
+    vid = (qs.get("v") or [None])[0]
+    if not vid:
+        m = _YOUTUBE_SHORTS_RE.search(parsed.path or "")
+        vid = m.group(1) if m else None
+    if vid:
+        return ("youtube", f"https://www.youtube.com/embed/{vid}")
+    return None
+
+
+def _embed_youtu_be(url, parsed):
+    vid = (parsed.path or "").strip("/").split("/")[0]
+    if vid:
+        return ("youtube", f"https://www.youtube.com/embed/{vid}")
+    return None
+
+
+def _embed_vimeo(url, parsed):
+    m = _VIMEO_ID_RE.search(parsed.path or "")
+    if m:
+        return ("vimeo", f"https://player.vimeo.com/video/{m.group(1)}")
+    return None
+
+
+def _embed_loom(url, parsed):
+    m = _LOOM_SHARE_RE.search(parsed.path or "")
+    if m:
+        return ("loom", f"https://www.loom.com/embed/{m.group(1)}")
+    return None
+
+
+_HOST_RULES = (
+    (("reddit.com", "redd.it"), _embed_reddit),
+    (("tiktok.com",), _embed_tiktok),
+    (("youtube.com",), _embed_youtube),
+    (("youtu.be",), _embed_youtu_be),
+    (("vimeo.com",), _embed_vimeo),
+    (("loom.com",), _embed_loom),
+)
+
+
 def normalize_embed(source_url: str):
     url = (source_url or "").strip()
     if not url:
@@ -627,36 +1292,12 @@ def normalize_embed(source_url: str):
     parsed = urlparse(url)
     host = (parsed.hostname or "").lower()
 
-    if "reddit.com" in host or "redd.it" in host:
-        return ("reddit", url)
-    if "tiktok.com" in host:
-        return ("tiktok", url)
-
-    if "youtube.com" in host:
-        qs = parse_qs(parsed.query)
-        vid = (qs.get("v") or [None])[0]
-        if not vid:
-            m = re.search(r"/shorts/([^/?]+)", parsed.path or "")
-            vid = m.group(1) if m else None
-        if vid:
-            return ("youtube", f"https://www.youtube.com/embed/{vid}")
-
-    if "youtu.be" in host:
-        vid = (parsed.path or "").strip("/").split("/")[0]
-        if vid:
-            return ("youtube", f"https://www.youtube.com/embed/{vid}")
-
-    if "vimeo.com" in host:
-        m = re.search(r"/(\d+)", parsed.path or "")
-        if m:
-            vid = m.group(1)
-            return ("vimeo", f"https://player.vimeo.com/video/{vid}")
-
-    if "loom.com" in host:
-        m = re.search(r"/share/([^/?]+)", parsed.path or "")
-        if m:
-            vid = m.group(1)
-            return ("loom", f"https://www.loom.com/embed/{vid}")
+    for suffixes, handler in _HOST_RULES:
+        if host.endswith(suffixes):
+            result = handler(url, parsed)
+            if result is not None:
+                return result
+            break
 
     return ("custom", url)
 
@@ -703,83 +1344,75 @@ def force_provider_embed(provider_choice: str, source_url: str):
 
 # ---------- Playlist helpers ----------
 def get_video_playlist(db, video_id: int):
-    row = db.execute(
-        q(
-            """
-            SELECT p.id as playlist_id, p.name as playlist_name
-            FROM playlist_items pi
-            JOIN playlists p ON p.id = pi.playlist_id
-            WHERE pi.video_id = ?
-            LIMIT 1
-            """,
-            """
-            SELECT p.id as playlist_id, p.name as playlist_name
-            FROM playlist_items pi
-            JOIN playlists p ON p.id = pi.playlist_id
-            WHERE pi.video_id = %s
-            LIMIT 1
-            """,
-        ),
-        (video_id,),
-    ).fetchone()
-    return row
-
-
-def get_playlist_items(db, playlist_id: int):
-    return db.execute(
-        q(
-            f"""
-            SELECT v.*, pi.position
-            FROM playlist_items pi
-            JOIN videos v ON v.id = pi.video_id
-            WHERE pi.playlist_id = ?
-            ORDER BY pi.position ASC, {dt("v.created_at")} DESC
-            """,
-            f"""
-            SELECT v.*, pi.position
-            FROM playlist_items pi
-            JOIN videos v ON v.id = pi.video_id
-            WHERE pi.playlist_id = %s
-            ORDER BY pi.position ASC, {dt("v.created_at")} DESC
-            """,
-        ),
-        (playlist_id,),
-    ).fetchall()
+    return db.execute(SQL_PLAYLIST_FOR_VIDEO, (video_id,)).fetchone()
 
 
-def get_next_in_playlist_id(db, playlist_id: int, current_video_id: int):
-    cur = db.execute(
-        q(
-            "SELECT position FROM playlist_items WHERE playlist_id=? AND video_id=?",
-            "SELECT position FROM playlist_items WHERE playlist_id=%s AND video_id=%s",
-        ),
-        (playlist_id, current_video_id),
-    ).fetchone()
-    if not cur:
-        return None
-    current_pos = int(cur["position"])
+# ---------- Routes ----------
+# Videos only change through the admin routes, so the homepage queries
+# are cached briefly per (sort, category, q) and dropped when an admin
+# mutates the videos table. View/like counters may lag by the TTL.
+_INDEX_TTL = 30  # seconds
+_INDEX_CACHE = {}  # (sort, category, qtext, page) -> (expires_at, categories, rows, has_next)
+# The key comes straight from query params, so arbitrary ?q=/?page=
+# values must not grow the dict without bound.
+_INDEX_CACHE_MAX = 256
+_INDEX_PER_PAGE = 24
+
+
+def _index_cache_put(key, value):
+    if len(_INDEX_CACHE) >= _INDEX_CACHE_MAX:
+        now = time.time()
+        for k in [k for k, v in _INDEX_CACHE.items() if v[0] <= now]:
+            _INDEX_CACHE.pop(k, None)
+        # Entries share one TTL, so insertion order is expiry order.
+        while len(_INDEX_CACHE) >= _INDEX_CACHE_MAX:
+            _INDEX_CACHE.pop(next(iter(_INDEX_CACHE)))
+    _INDEX_CACHE[key] = value
+
+# Only what index.html renders; embed_html/description/URLs would
+# dominate the bytes per row otherwise.
+_INDEX_COLUMNS = "id, title, thumbnail_url, provider, category, views, likes"
+
+# Built once so each filter permutation always produces byte-identical
+# SQL, which lets the PG server-side plan cache (prepare_threshold) hit.
+_INDEX_ORDER_SQL = {
+    "new": f"ORDER BY {dt('created_at')} DESC",
+    "views": f"ORDER BY views DESC, {dt('created_at')} DESC",
+    "likes": f"ORDER BY likes DESC, {dt('created_at')} DESC",
+}
 
-    nxt = db.execute(
-        q(
-            """
-            SELECT video_id FROM playlist_items
-            WHERE playlist_id=? AND position > ?
-            ORDER BY position ASC
-            LIMIT 1
-            """,
-            """
-            SELECT video_id FROM playlist_items
-            WHERE playlist_id=%s AND position > %s
-            ORDER BY position ASC
-            LIMIT 1
-            """,
-        ),
-        (playlist_id, current_pos),
-    ).fetchone()
-    return int(nxt["video_id"]) if nxt else None
+
+# The category list changes even less often than the listing itself, so
+# it gets its own longer-lived cache: an index-cache miss (new search
+# term, expired TTL) still reuses the category chips.
+_CATEGORIES_TTL = 60  # seconds
+_categories_cache = None  # (expires_at, names) or None
+
+
+def _categories(db):
+    global _categories_cache
+    hit = _categories_cache
+    if hit is not None and hit[0] > time.time():
+        return hit[1]
+    rows = db.execute(
+        """
+        SELECT DISTINCT TRIM(category) AS c
+        FROM videos
+        WHERE TRIM(category) != ''
+        ORDER BY LOWER(TRIM(category)) ASC
+        """
+    ).fetchall()
+    names = [r["c"] for r in rows if r["c"]]
+    _categories_cache = (time.time() + _CATEGORIES_TTL, names)
+    return names
+
+
+def _invalidate_index_cache():
+    global _categories_cache
+    _INDEX_CACHE.clear()
+    _categories_cache = None
 
 
-# ---------- Routes ----------
 @app.route("/")
 def index():
     db = get_db()
@@ -789,22 +1422,33 @@ def index():
     sort = (request.args.get("sort") or "new").strip().lower()
     if sort not in ("new", "views", "likes"):
         sort = "new"
+    try:
+        page = max(1, int(request.args.get("page", "1")))
+    except ValueError:
+        page = 1
+
+    cache_key = (sort, category, qtext, page)
+    hit = _INDEX_CACHE.get(cache_key)
+    if hit is not None and hit[0] > time.time():
+        categories, rows, has_next = hit[1], hit[2], hit[3]
+        return render_template(
+            "index.html",
+            videos=rows,
+            q=qtext,
+            categories=categories,
+            selected_cat=category,
+            sort=sort,
+            page=page,
+            has_next=has_next,
+        )
 
-    categories = db.execute(
-        f"""
-        SELECT DISTINCT TRIM(category) AS c
-        FROM videos
-        WHERE TRIM(category) != ''
-        ORDER BY LOWER(TRIM(category)) ASC
-        """
-    ).fetchall()
-    categories = [r["c"] for r in categories if r["c"]]
+    categories = _categories(db)
 
     where = []
     params = []
 
     if qtext:
-        op = like_op()
+        op = LIKE_OP
         where.append(f"(title {op} %s OR description {op} %s OR category {op} %s)" if IS_PG
                      else f"(title {op} ? OR description {op} ? OR category {op} ?)")
         params += [f"%{qtext}%", f"%{qtext}%", f"%{qtext}%"]
@@ -815,17 +1459,22 @@ def index():
 
     where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
-    if sort == "views":
-        order_sql = f"ORDER BY views DESC, {dt('created_at')} DESC"
-    elif sort == "likes":
-        order_sql = f"ORDER BY likes DESC, {dt('created_at')} DESC"
-    else:
-        order_sql = f"ORDER BY {dt('created_at')} DESC"
+    order_sql = _INDEX_ORDER_SQL[sort]
+
+    # Fetch one extra row to know whether a next page exists.
+    limit_sql = "LIMIT %s OFFSET %s" if IS_PG else "LIMIT ? OFFSET ?"
+    params += [_INDEX_PER_PAGE + 1, (page - 1) * _INDEX_PER_PAGE]
 
     rows = db.execute(
-        f"SELECT * FROM videos {where_sql} {order_sql}",
+        f"SELECT {_INDEX_COLUMNS} FROM videos {where_sql} {order_sql} {limit_sql}",
         tuple(params),
     ).fetchall()
+    rows = [dict(r) for r in rows]
+    has_next = len(rows) > _INDEX_PER_PAGE
+    if has_next:
+        rows = rows[:_INDEX_PER_PAGE]
+
+    _index_cache_put(cache_key, (time.time() + _INDEX_TTL, categories, rows, has_next))
 
     return render_template(
         "index.html",
@@ -834,104 +1483,82 @@ def index():
         categories=categories,
         selected_cat=category,
         sort=sort,
+        page=page,
+        has_next=has_next,
     )
 
 
+# Rendered watch pages for anonymous visitors are cached briefly per
+# (video, lang): they carry no personal state (no history, liked is
+# always false), so the HTML only changes when the video, its comments
+# or its playlist do — all of which invalidate below. View counters in
+# the cached HTML may lag by at most the TTL.
+_WATCH_TTL = 30  # seconds
+_WATCH_CACHE = {}  # (video_id, lang) -> (expires_at, html)
+
+
+def _invalidate_watch_cache(video_id=None):
+    if video_id is None:
+        _WATCH_CACHE.clear()
+        return
+    for key in [k for k in _WATCH_CACHE if k[0] == video_id]:
+        _WATCH_CACHE.pop(key, None)
+
+
 @app.route("/watch/<int:video_id>")
 def watch(video_id: int):
     db = get_db()
-    video = db.execute(
-        q("SELECT * FROM videos WHERE id=?", "SELECT * FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
+    user = current_user()
+
+    # Pending flash messages must render, so those requests skip the cache.
+    cacheable = user is None and not session.get("_flashes")
+    if cacheable:
+        hit = _WATCH_CACHE.get((video_id, get_lang()))
+        if hit is not None and hit[0] > time.time():
+            if (request.args.get("noview") or "") != "1":
+                _bump_views(video_id)
+            return hit[1]
+
+    # Like-state rides along with the video row instead of costing its
+    # own round trip to video_likes.
+    if user:
+        video = db.execute(SQL_VIDEO_BY_ID_WITH_LIKED, (user["id"], video_id)).fetchone()
+    else:
+        video = db.execute(SQL_VIDEO_BY_ID, (video_id,)).fetchone()
     if not video:
         abort(404)
+    # Show counts the DB has not absorbed yet (see _bump_views below).
+    video = dict(video)
+    liked = bool(video.pop("liked_flag", False))
 
     noview = (request.args.get("noview") or "") == "1"
     if not noview:
-        db.execute(
-            q("UPDATE videos SET views = views + 1 WHERE id=?", "UPDATE videos SET views = views + 1 WHERE id=%s"),
-            (video_id,),
-        )
-        db.commit()
+        _bump_views(video_id)
+    video["views"] += _pending_views(video_id)
 
-    user = current_user()
     if user:
-        now = datetime.utcnow().isoformat()
-        db.execute(
-            q(
-                """
-                INSERT INTO watch_history (user_id, video_id, last_watched_at, watch_count)
-                VALUES (?, ?, ?, 1)
-                ON CONFLICT(user_id, video_id)
-                DO UPDATE SET last_watched_at = excluded.last_watched_at,
-                             watch_count = watch_count + 1
-                """,
-                """
-                INSERT INTO watch_history (user_id, video_id, last_watched_at, watch_count)
-                VALUES (%s, %s, %s, 1)
-                ON CONFLICT(user_id, video_id)
-                DO UPDATE SET last_watched_at = EXCLUDED.last_watched_at,
-                             watch_count = watch_history.watch_count + 1
-                """,
-            ),
-            (user["id"], video_id, now),
-        )
-        db.commit()
+        # Recorded in memory and flushed with the view counters; /history
+        # may lag by up to the flush interval, which is fine for recency.
+        _bump_history(user["id"], video_id, g.now_iso)
 
-    video = db.execute(
-        q("SELECT * FROM videos WHERE id=?", "SELECT * FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
-
-    comments = db.execute(
-        q(
-            f"SELECT * FROM comments WHERE video_id=? ORDER BY {dt('created_at')} DESC",
-            f"SELECT * FROM comments WHERE video_id=%s ORDER BY {dt('created_at')} DESC",
-        ),
-        (video_id,),
-    ).fetchall()
+    comments = db.execute(SQL_COMMENTS_FOR_VIDEO, (video_id, COMMENTS_PER_PAGE)).fetchall()
 
-    liked = False
-    if user:
-        liked = db.execute(
-            q(
-                "SELECT 1 FROM video_likes WHERE user_id=? AND video_id=?",
-                "SELECT 1 FROM video_likes WHERE user_id=%s AND video_id=%s",
-            ),
-            (user["id"], video_id),
-        ).fetchone() is not None
-
-    playlist = get_video_playlist(db, video_id)
-    playlist_items = []
+    playlist_items = db.execute(SQL_PLAYLIST_SIDEBAR, (video_id,)).fetchall()
+    playlist = None
     next_in_playlist_id = None
-
-    if playlist:
-        pid = int(playlist["playlist_id"])
-        playlist_items = get_playlist_items(db, pid)
-        next_in_playlist_id = get_next_in_playlist_id(db, pid, video_id)
+    if playlist_items:
+        first = playlist_items[0]
+        playlist = {"playlist_id": first["playlist_id"], "playlist_name": first["playlist_name"]}
+        for item in playlist_items:
+            if item["id"] == video_id:
+                next_in_playlist_id = item["next_id"]
+                break
 
     recommended = []
     if not playlist:
-        recommended = db.execute(
-            q(
-                f"""
-                SELECT * FROM videos
-                WHERE id != ?
-                ORDER BY (provider = ?) DESC, {dt('created_at')} DESC
-                LIMIT 12
-                """,
-                f"""
-                SELECT * FROM videos
-                WHERE id != %s
-                ORDER BY (provider = %s) DESC, {dt('created_at')} DESC
-                LIMIT 12
-                """,
-            ),
-            (video_id, video["provider"]),
-        ).fetchall()
+        recommended = db.execute(SQL_RECOMMENDED, (video_id, video["provider"])).fetchall()
 
-    return render_template(
+    html = render_template(
         "watch.html",
         video=video,
         comments=comments,
@@ -941,64 +1568,66 @@ def watch(video_id: int):
         next_in_playlist_id=next_in_playlist_id,
         liked=liked,
     )
+    if cacheable:
+        _WATCH_CACHE[(video_id, get_lang())] = (time.time() + _WATCH_TTL, html)
+    return html
 
 
 @app.route("/watch/<int:video_id>/like", methods=["POST"])
 def like(video_id: int):
-    db = get_db()
-    v = db.execute(
-        q("SELECT id FROM videos WHERE id=?", "SELECT id FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
-    if not v:
-        abort(404)
-
     user = current_user()
     if not user:
-        wants_json = (
-            request.headers.get("X-Requested-With") == "XMLHttpRequest"
-            or "application/json" in (request.headers.get("Accept") or "")
-            or (request.args.get("ajax") == "1")
-        )
-        if wants_json:
+        if g.wants_json:
             return jsonify({"ok": False, "error": "login_required"}), 401
         flash(t("like_requires_login"), "error")
         return redirect(url_for("watch", video_id=video_id, noview=1))
 
+    # No existence pre-check: a missing video surfaces as an FK
+    # violation on the insert. The conflict-free insert plus counter
+    # update commit once; the fresh counter comes back via RETURNING.
+    db = get_db()
+    now = g.now_iso
     try:
-        db.execute(
-            q(
-                "INSERT INTO video_likes (user_id, video_id, created_at) VALUES (?, ?, ?)",
-                "INSERT INTO video_likes (user_id, video_id, created_at) VALUES (%s, %s, %s)",
-            ),
-            (user["id"], video_id, datetime.utcnow().isoformat()),
-        )
-        db.execute(
-            q("UPDATE videos SET likes = likes + 1 WHERE id=?", "UPDATE videos SET likes = likes + 1 WHERE id=%s"),
-            (video_id,),
-        )
-        db.commit()
-        liked_now = True
-    except Exception as e:
-        if is_unique_violation(e):
-            liked_now = True
+        if IS_PG:
+            row = db.execute(
+                """
+                WITH ins AS (
+                    INSERT INTO video_likes (user_id, video_id, created_at)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                UPDATE videos SET likes = likes + (SELECT COUNT(*) FROM ins)
+                WHERE id=%s
+                RETURNING likes
+                """,
+                (user["id"], video_id, now, video_id),
+            ).fetchone()
         else:
-            db.rollback() if IS_PG else None
-            flash(t("like_failed"), "error")
-            return redirect(url_for("watch", video_id=video_id, noview=1))
+            inserted = db.execute(
+                "INSERT OR IGNORE INTO video_likes (user_id, video_id, created_at) VALUES (?, ?, ?)",
+                (user["id"], video_id, now),
+            ).rowcount
+            row = db.execute(
+                "UPDATE videos SET likes = likes + ? WHERE id=? RETURNING likes",
+                (inserted, video_id),
+            ).fetchone()
+        db.commit()
+    except FK_ERR:
+        db.rollback()
+        abort(404)
+    except Exception:
+        db.rollback()
+        flash(t("like_failed"), "error")
+        return redirect(url_for("watch", video_id=video_id, noview=1))
 
-    likes_row = db.execute(
-        q("SELECT likes FROM videos WHERE id=?", "SELECT likes FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
-    likes = int(likes_row["likes"]) if likes_row else 0
+    if row is None:
+        abort(404)
+    _invalidate_watch_cache(video_id)
+    likes = int(row["likes"])
+    liked_now = True
 
-    wants_json = (
-        request.headers.get("X-Requested-With") == "XMLHttpRequest"
-        or "application/json" in (request.headers.get("Accept") or "")
-        or (request.args.get("ajax") == "1")
-    )
-    if wants_json:
+    if g.wants_json:
         return jsonify({"ok": True, "video_id": video_id, "likes": likes, "liked": liked_now})
 
     return redirect(url_for("watch", video_id=video_id, noview=1))
@@ -1007,13 +1636,6 @@ def like(video_id: int):
 @app.route("/watch/<int:video_id>/comment", methods=["POST"])
 def comment(video_id: int):
     db = get_db()
-    v = db.execute(
-        q("SELECT id FROM videos WHERE id=?", "SELECT id FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
-    if not v:
-        abort(404)
-
     user = current_user()
     author = (request.form.get("author") or "").strip()
     body = (request.form.get("body") or "").strip()
@@ -1027,20 +1649,18 @@ def comment(video_id: int):
     if not author:
         author = t("anon")
 
-    db.execute(
-        q(
-            """
-            INSERT INTO comments (video_id, user_id, author, body, created_at)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            """
-            INSERT INTO comments (video_id, user_id, author, body, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-        ),
-        (video_id, user["id"] if user else None, author[:50], body[:1000], datetime.utcnow().isoformat()),
-    )
-    db.commit()
+    # No existence pre-check: inserting against a missing video raises
+    # an FK violation, which is the 404 case.
+    try:
+        db.execute(
+            SQL_COMMENT_INSERT,
+            (video_id, user["id"] if user else None, author[:50], body[:1000], g.now_iso),
+        )
+        db.commit()
+    except FK_ERR:
+        db.rollback()
+        abort(404)
+    _invalidate_watch_cache(video_id)
     flash(t("comment_posted"), "ok")
     return redirect(url_for("watch", video_id=video_id, noview=1))
 
@@ -1052,25 +1672,7 @@ def history():
 
     user = current_user()
     db = get_db()
-    rows = db.execute(
-        q(
-            f"""
-            SELECT h.last_watched_at, h.watch_count, v.*
-            FROM watch_history h
-            JOIN videos v ON v.id = h.video_id
-            WHERE h.user_id = ?
-            ORDER BY {dt('h.last_watched_at')} DESC
-            """,
-            f"""
-            SELECT h.last_watched_at, h.watch_count, v.*
-            FROM watch_history h
-            JOIN videos v ON v.id = h.video_id
-            WHERE h.user_id = %s
-            ORDER BY {dt('h.last_watched_at')} DESC
-            """,
-        ),
-        (user["id"],),
-    ).fetchall()
+    rows = db.execute(SQL_HISTORY_PAGE, (user["id"],)).fetchall()
 
     return render_template("history.html", rows=rows)
 
@@ -1085,13 +1687,7 @@ def login():
         password = request.form.get("password") or ""
 
         db = get_db()
-        user = db.execute(
-            q(
-                "SELECT id, username, password_hash, is_admin FROM users WHERE username=?",
-                "SELECT id, username, password_hash, is_admin FROM users WHERE username=%s",
-            ),
-            (username,),
-        ).fetchone()
+        user = db.execute(SQL_USER_FOR_LOGIN, (username,)).fetchone()
 
         if not user or not check_password_hash(user["password_hash"], password):
             flash(t("bad_login"), "error")
@@ -1133,18 +1729,14 @@ def register():
         db = get_db()
         try:
             db.execute(
-                q(
-                    "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (?, ?, 0, ?)",
-                    "INSERT INTO users (username, password_hash, is_admin, created_at) VALUES (%s, %s, 0, %s)",
-                ),
-                (username, generate_password_hash(password), datetime.utcnow().isoformat()),
+                SQL_USER_REGISTER,
+                (username, hash_password(password), g.now_iso),
             )
             db.commit()
-        except Exception as e:
-            if is_unique_violation(e):
-                flash(t("username_exists"), "error")
-                return render_template("register.html")
-            raise
+        except UNIQUE_ERR:
+            db.rollback()
+            flash(t("username_exists"), "error")
+            return render_template("register.html")
 
         flash(t("account_created"), "ok")
         return redirect(url_for("login"))
@@ -1157,9 +1749,7 @@ def register():
 def admin():
     require_admin()
     db = get_db()
-    videos = db.execute(
-        f"SELECT * FROM videos ORDER BY {dt('created_at')} DESC"
-    ).fetchall()
+    videos = db.execute(SQL_ADMIN_VIDEOS).fetchall()
     return render_template("admin.html", videos=videos)
 
 
@@ -1183,24 +1773,12 @@ def admin_add():
         provider, embed_url, embed_html = force_provider_embed(provider_choice, source_url)
 
         db.execute(
-            q(
-                """
-                INSERT INTO videos
-                  (title, description, source_url, embed_url, thumbnail_url, provider, created_at, embed_html, category)
-                VALUES
-                  (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                """
-                INSERT INTO videos
-                  (title, description, source_url, embed_url, thumbnail_url, provider, created_at, embed_html, category)
-                VALUES
-                  (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
-            ),
+            SQL_VIDEO_INSERT,
             (title, description, source_url, embed_url, thumbnail_url, provider,
-             datetime.utcnow().isoformat(), embed_html, category),
+             g.now_iso, embed_html, category),
         )
         db.commit()
+        _invalidate_index_cache()
         flash(t("video_added"), "ok")
         return redirect(url_for("admin"))
 
@@ -1211,14 +1789,11 @@ def admin_add():
 def admin_video_edit(video_id: int):
     require_admin()
     db = get_db()
-    video = db.execute(
-        q("SELECT * FROM videos WHERE id=?", "SELECT * FROM videos WHERE id=%s"),
-        (video_id,),
-    ).fetchone()
+    video = db.execute(SQL_VIDEO_BY_ID, (video_id,)).fetchone()
     if not video:
         abort(404)
 
-    playlists = db.execute(f"SELECT id, name FROM playlists ORDER BY {dt('created_at')} DESC").fetchall()
+    playlists = db.execute(SQL_PLAYLISTS_LIST).fetchall()
     current_pl = get_video_playlist(db, video_id)
 
     if request.method == "POST":
@@ -1245,74 +1820,44 @@ def admin_video_edit(video_id: int):
 
         provider, embed_url, embed_html = force_provider_embed(provider_choice, source_url)
 
-        db.execute(
-            q(
-                """
-                UPDATE videos
-                SET title=?, description=?, source_url=?, embed_url=?, thumbnail_url=?,
-                    provider=?, embed_html=?, category=?
-                WHERE id=?
-                """,
-                """
-                UPDATE videos
-                SET title=%s, description=%s, source_url=%s, embed_url=%s, thumbnail_url=%s,
-                    provider=%s, embed_html=%s, category=%s
-                WHERE id=%s
-                """,
-            ),
-            (title, description, source_url, embed_url, thumbnail_url, provider, embed_html, category, video_id),
-        )
+        if not IS_PG:
+            # Take the write lock up front instead of escalating from a
+            # read lock halfway through the multi-statement save.
+            db.execute("BEGIN IMMEDIATE")
 
-        chosen_playlist_id = None
-        if new_playlist_name:
-            if IS_PG:
+        # On Postgres the save is pipelined: statements are sent
+        # back-to-back without waiting for individual responses, so the
+        # whole edit costs one round-trip plus the commit.
+        with (db.pipeline() if IS_PG else nullcontext()):
+            db.execute(
+                SQL_VIDEO_UPDATE,
+                (title, description, source_url, embed_url, thumbnail_url, provider, embed_html, category, video_id),
+            )
+
+            chosen_playlist_id = None
+            if new_playlist_name:
                 chosen_playlist_id = db.execute(
-                    "INSERT INTO playlists (name, created_at) VALUES (%s, %s) RETURNING id",
-                    (new_playlist_name[:120], datetime.utcnow().isoformat()),
+                    SQL_PLAYLIST_INSERT,
+                    (new_playlist_name[:120], g.now_iso),
                 ).fetchone()["id"]
-            else:
-                db.execute(
-                    "INSERT INTO playlists (name, created_at) VALUES (?, ?)",
-                    (new_playlist_name[:120], datetime.utcnow().isoformat()),
-                )
-                chosen_playlist_id = db.execute("SELECT last_insert_rowid() AS id").fetchone()["id"]
-        elif playlist_id and playlist_id != "none":
-            try:
-                chosen_playlist_id = int(playlist_id)
-            except Exception:
-                chosen_playlist_id = None
-
-        if current_pl:
-            old_id = int(current_pl["playlist_id"])
-            if (chosen_playlist_id is None) or (chosen_playlist_id != old_id):
-                db.execute(
-                    q(
-                        "DELETE FROM playlist_items WHERE playlist_id=? AND video_id=?",
-                        "DELETE FROM playlist_items WHERE playlist_id=%s AND video_id=%s",
-                    ),
-                    (old_id, video_id),
-                )
+            elif playlist_id and playlist_id != "none":
+                try:
+                    chosen_playlist_id = int(playlist_id)
+                except Exception:
+                    chosen_playlist_id = None
 
-        if chosen_playlist_id is not None:
-            db.execute(
-                q(
-                    """
-                    INSERT INTO playlist_items (playlist_id, video_id, position)
-                    VALUES (?, ?, ?)
-                    ON CONFLICT(playlist_id, video_id)
-                    DO UPDATE SET position=excluded.position
-                    """,
-                    """
-                    INSERT INTO playlist_items (playlist_id, video_id, position)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT(playlist_id, video_id)
-                    DO UPDATE SET position=EXCLUDED.position
-                    """,
-                ),
-                (chosen_playlist_id, video_id, position),
-            )
+            if current_pl:
+                old_id = int(current_pl["playlist_id"])
+                if (chosen_playlist_id is None) or (chosen_playlist_id != old_id):
+                    db.execute(SQL_PLAYLIST_ITEM_DELETE, (old_id, video_id))
+
+            if chosen_playlist_id is not None:
+                db.execute(SQL_PLAYLIST_ITEM_UPSERT, (chosen_playlist_id, video_id, position))
 
         db.commit()
+        _invalidate_index_cache()
+        # Playlist membership shows up in sibling watch pages too.
+        _invalidate_watch_cache()
         flash(t("video_updated"), "ok")
         return redirect(url_for("admin"))
 
@@ -1328,11 +1873,12 @@ def admin_video_edit(video_id: int):
 def admin_delete(video_id: int):
     require_admin()
     db = get_db()
-    db.execute(
-        q("DELETE FROM videos WHERE id=?", "DELETE FROM videos WHERE id=%s"),
-        (video_id,),
-    )
+    deleted = db.execute(SQL_VIDEO_DELETE, (video_id,)).fetchone()
     db.commit()
+    if deleted is None:
+        abort(404)
+    _invalidate_index_cache()
+    _invalidate_watch_cache()
     flash(t("video_deleted"), "ok")
     return redirect(url_for("admin"))
 
@@ -1342,9 +1888,7 @@ def admin_delete(video_id: int):
 def admin_users():
     require_admin()
     db = get_db()
-    users = db.execute(
-        f"SELECT id, username, is_admin, created_at FROM users ORDER BY {dt('created_at')} DESC"
-    ).fetchall()
+    users = db.execute(SQL_ADMIN_USERS).fetchall()
     return render_template("admin_users.html", users=users, main_admin=ADMIN_USERNAME)
 
 
@@ -1352,13 +1896,7 @@ def admin_users():
 def admin_user_edit(user_id: int):
     require_admin()
     db = get_db()
-    user = db.execute(
-        q(
-            "SELECT id, username, is_admin, created_at FROM users WHERE id=?",
-            "SELECT id, username, is_admin, created_at FROM users WHERE id=%s",
-        ),
-        (user_id,),
-    ).fetchone()
+    user = db.execute(SQL_USER_EDIT_BY_ID, (user_id,)).fetchone()
     if not user:
         abort(404)
 
@@ -1374,30 +1912,17 @@ def admin_user_edit(user_id: int):
 
         if new_username and new_username != user["username"]:
             try:
-                db.execute(
-                    q("UPDATE users SET username=? WHERE id=?", "UPDATE users SET username=%s WHERE id=%s"),
-                    (new_username, user_id),
-                )
+                db.execute(SQL_USER_SET_USERNAME, (new_username, user_id))
                 db.commit()
-            except Exception as e:
-                if is_unique_violation(e):
-                    flash(t("username_exists"), "error")
-                    return redirect(url_for("admin_user_edit", user_id=user_id))
-                raise
+            except UNIQUE_ERR:
+                db.rollback()
+                flash(t("username_exists"), "error")
+                return redirect(url_for("admin_user_edit", user_id=user_id))
 
-        db.execute(
-            q("UPDATE users SET is_admin=? WHERE id=?", "UPDATE users SET is_admin=%s WHERE id=%s"),
-            (is_admin, user_id),
-        )
+        db.execute(SQL_USER_SET_ADMIN, (is_admin, user_id))
 
         if new_password:
-            db.execute(
-                q(
-                    "UPDATE users SET password_hash=? WHERE id=?",
-                    "UPDATE users SET password_hash=%s WHERE id=%s",
-                ),
-                (generate_password_hash(new_password), user_id),
-            )
+            db.execute(SQL_USER_SET_PASSWORD, (hash_password(new_password), user_id))
 
         db.commit()
         flash(t("user_updated"), "ok")
@@ -1406,6 +1931,11 @@ def admin_user_edit(user_id: int):
     return render_template("admin_user_edit.html", u=user, is_main_admin=is_main_admin)
 
 
+# Run schema setup once per process (Render/Gunicorn imports this module).
+with app.app_context():
+    init_db()
+
+
 if __name__ == "__main__":
     # Lokal dev. Render/Gunicorn använder inte detta.
     app.run(debug=True, host="127.0.0.1", port=5000)